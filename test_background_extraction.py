@@ -6,9 +6,10 @@ This script demonstrates how to extract only the background from images using re
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image
-import numpy as np
+from PIL import Image, ImageChops
 
 # Import rembg
 try:
@@ -18,6 +19,24 @@ except ImportError as e:
     print(f"❌ Error importing rembg: {e}")
     sys.exit(1)
 
+# Fast zlib level for the PNG outputs in onlybg/
+PNG_COMPRESS_LEVEL = int(os.environ.get("REMBG_TEST_PNG_COMPRESS_LEVEL", "1"))
+
+# Approximate per-core L2 size, used to size row tiles for the alpha write
+L2_CACHE_BYTES = 1 << 20
+
+_SESSION_CACHE = {}
+
+def _get_session(name="u2net"):
+    """Return a rembg session for the given model, creating it only once."""
+    if name not in _SESSION_CACHE:
+        _SESSION_CACHE[name] = new_session(name)
+    return _SESSION_CACHE[name]
+
+def _row_tile_height(width, l2_bytes=L2_CACHE_BYTES):
+    """Return how many image rows of mask + RGBA output fit in L2 at once."""
+    return max(1, l2_bytes // (width * 4 * 2))
+
 def create_output_directory():
     """Create the onlybg output directory if it doesn't exist."""
     output_dir = Path("onlybg")
@@ -25,71 +44,77 @@ def create_output_directory():
     print(f"📁 Output directory: {output_dir.absolute()}")
     return output_dir
 
-def extract_background_using_mask_inversion():
-    """Extract background by inverting the rembg mask."""
-    print("\n🔍 Testing background extraction using mask inversion...")
-    
-    output_dir = create_output_directory()
-    
-    # Check if we have example images
+@lru_cache(maxsize=None)
+def _example_images():
+    """Return the example image paths, or an empty tuple if none are found."""
     examples_dir = Path("examples")
     if not examples_dir.exists():
         print("❌ Examples directory not found.")
-        return False
+        return ()
     
-    example_images = list(examples_dir.glob("*.jpg")) + list(examples_dir.glob("*.png"))
+    # One directory pass instead of a glob per extension; JPEGs still come first
+    by_suffix = {".jpg": [], ".png": []}
+    with os.scandir(examples_dir) as entries:
+        for entry in entries:
+            images = by_suffix.get(os.path.splitext(entry.name)[1].lower())
+            if images is not None and entry.is_file():
+                images.append(Path(entry.path))
+    example_images = tuple(by_suffix[".jpg"] + by_suffix[".png"])
     if not example_images:
         print("❌ No example images found.")
-        return False
+    return example_images
+
+@lru_cache(maxsize=None)
+def _first_example():
+    """Return the first example image path and its decoded image, or None."""
+    example_images = _example_images()
+    if not example_images:
+        return None
     
     input_image_path = example_images[0]
-    print(f"📸 Using input image: {input_image_path.name}")
+    input_image = Image.open(input_image_path)
+    # Decode once up front so later array views don't trigger a lazy decode
+    input_image.load()
+    return input_image_path, input_image
+
+def get_foreground_mask(original_image):
+    """Run rembg once and return the single-band foreground mask, or None on failure."""
+    print("\n🔍 Getting foreground mask...")
+    try:
+        # Both extraction methods are derived from this single mask
+        mask = remove(original_image, only_mask=True, session=_get_session())
+        # Normalize the shape here so both methods can treat it as 2-D
+        if mask.mode != 'L':
+            mask = mask.getchannel(0)
+        return mask
+    except Exception as e:
+        print(f"   ❌ Error getting foreground mask: {e}")
+        return None
+
+def extract_background_using_mask_inversion(input_image_path, original_image, mask):
+    """Extract background by inverting the rembg mask."""
+    print("\n🔍 Testing background extraction using mask inversion...")
+    
+    output_dir = create_output_directory()
     
     try:
-        # Load original image
-        original_image = Image.open(input_image_path)
-        
-        # Get the mask using rembg (this gives us the foreground mask)
-        print("   Getting foreground mask...")
-        mask = remove(original_image, only_mask=True)
-        
-        # Convert mask to numpy array
-        mask_array = np.array(mask)
-        
-        # Invert the mask to get background mask
+        # Invert the mask to get background mask (native Pillow, no numpy round-trip)
         print("   Inverting mask to get background...")
-        background_mask = 255 - mask_array
-        
-        # Convert back to PIL Image
-        background_mask_pil = Image.fromarray(background_mask.astype(np.uint8))
+        background_mask_pil = ImageChops.invert(mask)
         
-        # Apply the background mask to the original image
+        # Apply the background mask to the original image as its alpha band
         print("   Applying background mask to original image...")
-        original_array = np.array(original_image)
-        
-        # Create a 4-channel image (RGBA) if it's not already
-        if original_array.shape[2] == 3:
-            # Add alpha channel
-            rgba_image = np.zeros((original_array.shape[0], original_array.shape[1], 4), dtype=np.uint8)
-            rgba_image[:, :, :3] = original_array
-            rgba_image[:, :, 3] = 255  # Full opacity
-        else:
-            rgba_image = original_array
-        
-        # Apply the background mask to the alpha channel
-        rgba_image[:, :, 3] = background_mask[:, :, 0] if background_mask.ndim == 3 else background_mask
-        
-        # Convert back to PIL Image
-        background_image = Image.fromarray(rgba_image, 'RGBA')
+        r, g, b = original_image.convert('RGB').split()
+        background_image = Image.merge('RGBA', (r, g, b, background_mask_pil))
         
         # Save the background
         output_path = output_dir / f"background_extracted_{input_image_path.stem}.png"
-        background_image.save(output_path)
+        background_image.save(output_path, compress_level=PNG_COMPRESS_LEVEL)
         print(f"   ✅ Saved background as: {output_path}")
         
         # Also save the inverted mask for reference
         mask_output_path = output_dir / f"background_mask_{input_image_path.stem}.png"
-        background_mask_pil.save(mask_output_path)
+        background_mask_pil.save(mask_output_path, compress_level=PNG_COMPRESS_LEVEL)
         print(f"   ✅ Saved background mask as: {mask_output_path}")
         
         return True
@@ -98,59 +123,53 @@ def extract_background_using_mask_inversion():
         print(f"   ❌ Error during background extraction: {e}")
         return False
 
-def extract_background_using_alpha_compositing():
+def extract_background_using_alpha_compositing(input_image_path, original_image, mask):
     """Extract background using alpha compositing technique."""
+    import numpy as np
+    
     print("\n🔍 Testing background extraction using alpha compositing...")
     
     output_dir = create_output_directory()
     
-    examples_dir = Path("examples")
-    if not examples_dir.exists():
-        print("❌ Examples directory not found.")
-        return False
-    
-    example_images = list(examples_dir.glob("*.jpg")) + list(examples_dir.glob("*.png"))
-    if not example_images:
-        print("❌ No example images found.")
-        return False
-    
-    input_image_path = example_images[0]
-    print(f"📸 Using input image: {input_image_path.name}")
-    
     try:
-        # Load original image
-        original_image = Image.open(input_image_path)
-        
-        # Remove background (get foreground with transparent background)
-        print("   Removing background to get foreground...")
-        foreground = remove(original_image)
-        
-        # Create a white background image
-        print("   Creating white background...")
-        white_bg = Image.new('RGBA', original_image.size, (255, 255, 255, 255))
-        
-        # Composite foreground over white background
-        print("   Compositing foreground over white background...")
-        composite = Image.alpha_composite(white_bg, foreground)
-        
-        # Now subtract the foreground from original to get background
+        # The foreground alpha rembg would produce is exactly this mask,
+        # so subtract it from the original to get background
         print("   Subtracting foreground from original...")
-        original_array = np.array(original_image.convert('RGBA'))
-        composite_array = np.array(composite)
-        foreground_array = np.array(foreground)
+        mask_array = np.asarray(mask)
         
         # Create background by subtracting foreground
-        background_array = original_array.copy()
-        
-        # Where foreground has alpha > 0, make background transparent
-        alpha_mask = foreground_array[:, :, 3] > 0
-        background_array[alpha_mask, 3] = 0  # Make transparent where foreground exists
+        if original_image.mode in ('RGB', 'L'):
+            # No source alpha to preserve: fill the RGB planes directly and
+            # write the alpha once, instead of converting to RGBA first
+            rgb_image = original_image if original_image.mode == 'RGB' else original_image.convert('RGB')
+            background_array = np.empty((rgb_image.height, rgb_image.width, 4), dtype=np.uint8)
+            background_array[:, :, :3] = np.asarray(rgb_image)
+            # Zero-stride view, so opaque source alpha costs no memory
+            source_alpha = np.broadcast_to(np.uint8(255), mask_array.shape)
+        else:
+            background_array = np.asarray(original_image.convert('RGBA')).copy()
+            source_alpha = background_array[:, :, 3]
+        
+        # Quantize the mask to a boolean background mask (< 128) and make the
+        # background transparent wherever the foreground is
+        # (one ufunc pass per row tile, so the boolean temporary and the
+        # written rows stay cache-resident instead of streaming through DRAM)
+        background_alpha = background_array[:, :, 3]
+        tile_height = _row_tile_height(mask_array.shape[1])
+        for y0 in range(0, mask_array.shape[0], tile_height):
+            rows = slice(y0, y0 + tile_height)
+            np.multiply(
+                source_alpha[rows],
+                mask_array[rows] < 128,
+                out=background_alpha[rows],
+                casting='unsafe',
+            )
         
         background_image = Image.fromarray(background_array, 'RGBA')
         
         # Save the background
         output_path = output_dir / f"background_alpha_composite_{input_image_path.stem}.png"
-        background_image.save(output_path)
+        background_image.save(output_path, compress_level=PNG_COMPRESS_LEVEL)
         print(f"   ✅ Saved background as: {output_path}")
         
         return True
@@ -164,14 +183,37 @@ def main():
     print("🚀 Starting Background Extraction Tests")
     print("=" * 50)
     
+    example = _first_example()
+    if example is None:
+        print("❌ Background extraction tests failed!")
+        return
+    
+    input_image_path, original_image = example
+    print(f"📸 Using input image: {input_image_path.name}")
+    
+    mask = get_foreground_mask(original_image)
+    if mask is None:
+        print("❌ Background extraction tests failed!")
+        return
+    
+    # Both methods only transform the shared mask, so run them side by side;
+    # the PNG encode of one overlaps with the array work of the other
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        mask_inversion = executor.submit(
+            extract_background_using_mask_inversion, input_image_path, original_image, mask
+        )
+        alpha_compositing = executor.submit(
+            extract_background_using_alpha_compositing, input_image_path, original_image, mask
+        )
+    
     # Test mask inversion method
-    if extract_background_using_mask_inversion():
+    if mask_inversion.result():
         print("✅ Background extraction using mask inversion passed!")
     else:
         print("❌ Background extraction using mask inversion failed!")
     
     # Test alpha compositing method
-    if extract_background_using_alpha_compositing():
+    if alpha_compositing.result():
         print("✅ Background extraction using alpha compositing passed!")
     else:
         print("❌ Background extraction using alpha compositing failed!")
@@ -5,25 +5,63 @@ This script demonstrates how to use SAM (Segment Anything Model) for background
 Note: This requires additional dependencies (segment-anything, torch, etc.)
 """
 
+import importlib.util
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
-from PIL import Image
-import numpy as np
+
+SAM_CHECKPOINT = Path("sam_vit_h_4b8939.pth")
+SAM_CHECKPOINT_URL = f"https://dl.fbaipublicfiles.com/segment_anything/{SAM_CHECKPOINT.name}"
+
+@lru_cache(maxsize=None)
+def _first_example():
+    """Return the first example image path and its decoded image, or None."""
+    from PIL import Image
+    
+    examples_dir = Path("examples")
+    if not examples_dir.exists():
+        print("❌ Examples directory not found.")
+        return None
+    
+    # One directory pass instead of a glob per extension; JPEGs still come first
+    by_suffix = {".jpg": [], ".png": []}
+    with os.scandir(examples_dir) as entries:
+        for entry in entries:
+            images = by_suffix.get(os.path.splitext(entry.name)[1].lower())
+            if images is not None and entry.is_file():
+                images.append(Path(entry.path))
+    example_images = by_suffix[".jpg"] + by_suffix[".png"]
+    if not example_images:
+        print("❌ No example images found.")
+        return None
+    
+    input_image_path = example_images[0]
+    input_image = Image.open(input_image_path)
+    # Decode once up front so repeated calls reuse the same pixel data
+    input_image.load()
+    return input_image_path, input_image
 
 def check_sam_dependencies():
-    """Check if SAM dependencies are available."""
-    try:
-        import torch
-        import segment_anything
-        print("✅ SAM dependencies available!")
-        return True
-    except ImportError as e:
-        print(f"❌ SAM dependencies not available: {e}")
+    """Check if the SAM model weights and dependencies are available."""
+    # Check the weights first, and only locate (not import) the packages,
+    # so a missing checkpoint never pays for loading torch
+    if not SAM_CHECKPOINT.exists():
+        print(f"❌ SAM model weights not found: {SAM_CHECKPOINT}")
+        print("To download the SAM model (~2.4GB), run:")
+        print(f"wget {SAM_CHECKPOINT_URL}")
+        return False
+    
+    missing = [name for name in ("torch", "segment_anything") if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ SAM dependencies not available: {', '.join(missing)}")
         print("To install SAM dependencies, run:")
         print("pip install torch torchvision")
         print("pip install git+https://github.com/facebookresearch/segment-anything.git")
         return False
+    
+    print("✅ SAM dependencies available!")
+    return True
 
 def extract_background_with_sam():
     """Extract background using SAM (Segment Anything Model)."""
@@ -33,6 +71,8 @@ def extract_background_with_sam():
         return False
     
     try:
+        # Only pay for the torch import once the weights are known to exist
+        import numpy as np
         import torch
         from segment_anything import SamPredictor, sam_model_registry
         
@@ -40,27 +80,18 @@ def extract_background_with_sam():
         output_dir.mkdir(exist_ok=True)
         
         # Check if we have example images
-        examples_dir = Path("examples")
-        if not examples_dir.exists():
-            print("❌ Examples directory not found.")
-            return False
-        
-        example_images = list(examples_dir.glob("*.jpg")) + list(examples_dir.glob("*.png"))
-        if not example_images:
-            print("❌ No example images found.")
+        example = _first_example()
+        if example is None:
             return False
         
-        input_image_path = example_images[0]
+        input_image_path, image = example
         print(f"📸 Using input image: {input_image_path.name}")
         
-        # Load image
-        image = Image.open(input_image_path)
         image_array = np.array(image)
         
         # Initialize SAM (you'll need to download the model first)
         print("   Initializing SAM model...")
-        print("   Note: You need to download the SAM model first:")
-        print("   wget https://dl.fbaipublicfiles.com/segment_anything/sam_vit_h_4b8939.pth")
+        print(f"   Using SAM model weights: {SAM_CHECKPOINT}")
         
         # For now, we'll show the structure without the actual model
         print("   SAM model structure would be initialized here...")
@@ -74,7 +105,6 @@ def extract_background_with_sam():
         # 6. Apply to original image
         
         print("   SAM background extraction would be implemented here...")
-        print("   This requires downloading the SAM model file (~2.4GB)")
         
         return True
         